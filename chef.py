@@ -5,42 +5,65 @@ Sushi Chef for https://k12.thoughtfullearning.com
 """
 
 from collections import defaultdict
+import concurrent.futures
+import functools
+import hashlib
 import html
 import os
 import re
 import requests
+from requests.adapters import HTTPAdapter
+import shutil
 import tempfile
+import threading
 import time
 from urllib.parse import urlparse, parse_qs
-import uuid
+from urllib3.util.retry import Retry
 
-from bs4 import BeautifulSoup
-import youtube_dl
+from bs4 import BeautifulSoup, SoupStrainer
 
 import le_utils.constants
 from ricecooker.chefs import SushiChef
 from ricecooker.classes import nodes, files, licenses
 from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter, InvalidatingCacheControlAdapter
-from ricecooker.utils.browser import preview_in_browser
-from ricecooker.utils.html import download_file, WebDriver
 from ricecooker.utils.zip import create_predictable_zip
 from ricecooker.utils.downloader import download_static_assets
-import selenium.webdriver.support.ui as selenium_ui
-from distutils.dir_util import copy_tree
 
 
+k12_base_url = 'https://k12.thoughtfullearning.com'
+
 sess = requests.Session()
 cache = FileCache('.webcache')
-forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache)
 
-ydl = youtube_dl.YoutubeDL({
+# Retry gateway failures inside the adapter, handing the last response back
+# to make_request once retries run out. Connection and read errors are left
+# to make_request's own retry loop, so they are not retried twice over.
+retry_policy = Retry(total=5, connect=0, read=0, backoff_factor=0.5,
+        status_forcelist=[502, 503, 504], raise_on_status=False)
+
+forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache,
+        pool_connections=32, pool_maxsize=32, max_retries=retry_policy)
+
+# youtube_dl pulls in hundreds of extractor modules, so it is only imported
+# and set up (see get_youtube_info) once a page actually embeds a video.
+ydl = None
+ydl_options = {
     'quiet': True,
     'no_warnings': True,
     'writesubtitles': True,
     'allsubtitles': True,
-})
+}
+# YoutubeDL keeps per-instance state, so content pages downloaded on
+# different threads take turns probing videos.
+ydl_lock = threading.Lock()
+
+# Hosts without the forever cache still get a pooled keep-alive adapter.
+pooled_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+        max_retries=retry_policy)
 
-sess.mount('https://k12.thoughtfullearning.com', forever_adapter)
+sess.mount('https://', pooled_adapter)
+sess.mount('http://', pooled_adapter)
+sess.mount(k12_base_url, forever_adapter)
 sess.mount('http://fonts.googleapis.com', forever_adapter)
 sess.mount('https://apis.google.com', forever_adapter)
 sess.mount('http://ajax.googleapis.com', forever_adapter)
@@ -51,6 +74,25 @@ headers = {
     "Accept-Encoding": "gzip, deflate",
     "Connection": "keep-alive"
 }
+sess.headers.update(headers)
+
+
+def get_scratch_dir(min_free_bytes=1024 ** 3):
+    """
+    Page folders are written out and zipped straight away, so build them on
+    the RAM-backed /dev/shm when it is writable and has room for many pages
+    in flight. Returns None, meaning the default tempdir on disk, otherwise;
+    containers often mount a /dev/shm of only 64 MB.
+    """
+    if not hasattr(os, 'statvfs') or not os.access('/dev/shm', os.W_OK):
+        return None
+    stats = os.statvfs('/dev/shm')
+    if stats.f_bavail * stats.f_frsize < min_free_bytes:
+        return None
+    return '/dev/shm'
+
+
+scratch_dir = get_scratch_dir()
 
 
 class ThoughtfulLearningChef(SushiChef):
@@ -82,25 +124,26 @@ class ThoughtfulLearningChef(SushiChef):
             language = "en",
         )
 
-        print()
-        print("-" * 80)
-        print("Downloading all minilesson")
-        channel.add_child(download_all_minilessons())
-
-        print()
-        print("-" * 80)
-        print("Downloading all student models")
-        channel.add_child(download_all_student_models())
+        sections = (
+            ("Downloading all minilesson", download_all_minilessons),
+            ("Downloading all student models", download_all_student_models),
+            ("Downloading all writing topics", download_all_writing_topics),
+            ("Downloading all writing assessments", download_all_writing_assessments),
+        )
 
-        print()
-        print("-" * 80)
-        print("Downloading all writing topics")
-        channel.add_child(download_all_writing_topics())
+        # The sections are independent, so crawl them side by side. Their
+        # content pages all share `download_executor`, and this separate pool
+        # only waits on the four sections, so it can never starve it.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(sections)) as section_executor:
+            futures = []
+            for message, download_section in sections:
+                print()
+                print("-" * 80)
+                print(message)
+                futures.append(section_executor.submit(download_section))
 
-        print()
-        print("-" * 80)
-        print("Downloading all writing assessments")
-        channel.add_child(download_all_writing_assessments())
+            for future in futures:
+                channel.add_child(future.result())
 
         return channel
 
@@ -109,7 +152,7 @@ class ThoughtfulLearningChef(SushiChef):
 # Minilessons
 
 
-minilesson_thumbnail = "https://k12.thoughtfullearning.com/sites/k12/files/images/minilessonResources.png"
+minilesson_thumbnail = k12_base_url + "/sites/k12/files/images/minilessonResources.png"
 
 
 def download_all_minilessons():
@@ -122,7 +165,8 @@ def download_all_minilessons():
     )
 
     doc = get_parsed_html_from_url(
-            'https://k12.thoughtfullearning.com/resources/minilessons')
+            k12_base_url + '/resources/minilessons',
+            strainer=class_strainer('pane-views-panes'))
     for pane in doc.select('.pane-views-panes'):
         title = pane.select_one('.view-header').text.strip()
         category_node = nodes.TopicNode(source_id=title, title=title, language="en")
@@ -135,6 +179,7 @@ def download_all_minilessons():
 
 def download_minilesson_category(category_node, category_doc):
     scraped_urls = set()
+    lessons = []
 
     for row in category_doc.select('.views-row'):
         screenshot = row.select_one('.views-field-field-minilesson-screenshot img')
@@ -143,24 +188,29 @@ def download_minilesson_category(category_node, category_doc):
         else:
             thumbnail = row.select_one('.views-field-field-minilesson-video img')['src']
 
-        title = row.select_one('.views-field-title').text.strip()
+        # The title field holds both the title text and the lesson link, so
+        # locate it once and look for the link inside it.
+        title_field = row.select_one('.views-field-title')
+        title = title_field.text.strip()
 
-        url = make_fully_qualified_url(row.select_one('.views-field-title a')['href'])
+        url = make_fully_qualified_url(title_field.select_one('a')['href'])
         if url in scraped_urls:
-            print('url %s is repeated', url)
+            print('url %s is repeated' % url)
             continue
         scraped_urls.add(url)
 
         description = row.select_one('.views-field-field-minilesson-summary').text.strip()
         print("    Downloading minilesson %s from %s" % (title, url))
-        download_content_node(category_node, url, title, thumbnail, description)
+        lessons.append((url, title, thumbnail, description))
+
+    download_content_nodes(category_node, lessons)
 
 
 ################################################################################
 # Student models
 
 
-student_model_thumbnail = "https://k12.thoughtfullearning.com/sites/k12/files/images/studentModelResources.png"
+student_model_thumbnail = k12_base_url + "/sites/k12/files/images/studentModelResources.png"
 
 
 def download_all_student_models():
@@ -173,7 +223,8 @@ def download_all_student_models():
     )
 
     doc = get_parsed_html_from_url(
-            'https://k12.thoughtfullearning.com/resources/studentmodels')
+            k12_base_url + '/resources/studentmodels',
+            strainer=class_strainer('view-content'))
     for level in doc.select('.view-content .view-grouping'):
         title = level.select_one('.view-grouping-header').contents[0].strip()
         level_node = nodes.TopicNode(source_id=title, title=title, language="en")
@@ -199,20 +250,23 @@ def download_student_model_level(level_node, level_doc):
 
 
 def download_student_model_category(category_node, category_doc):
+    articles = []
     for article in category_doc.select('ul li'):
         title = article.select_one('.views-field-title').text.strip()
         form = article.select_one('.views-field-field-form').text.strip()
         combined_title = "%s (%s)" % (title, form)
         url = make_fully_qualified_url(article.select_one('.views-field-title a')['href'])
         print("        Downloading student model article: %s" % combined_title)
-        download_content_node(category_node, url, combined_title, student_model_thumbnail)
+        articles.append((url, combined_title, student_model_thumbnail))
+
+    download_content_nodes(category_node, articles)
 
 
 ################################################################################
 # Writing topics
 
 
-writing_topic_thumbnail = "https://k12.thoughtfullearning.com/sites/k12/files/images/writingTopicResources.png"
+writing_topic_thumbnail = k12_base_url + "/sites/k12/files/images/writingTopicResources.png"
 
 
 def download_all_writing_topics():
@@ -227,7 +281,8 @@ def download_all_writing_topics():
     )
 
     doc = get_parsed_html_from_url(
-            'https://k12.thoughtfullearning.com/resources/writingtopics')
+            k12_base_url + '/resources/writingtopics',
+            strainer=class_strainer('view-content'))
     for level in doc.select('.view-content .view-grouping'):
         title = level.select_one('.view-grouping-header').contents[0].strip()
         level_node = nodes.TopicNode(source_id=title, title=title, language="en")
@@ -246,19 +301,9 @@ def download_writing_topic_level(level_node, level_doc):
         level_node.add_child(node)
 
 
-def download_writing_topic_category(category_doc, title, level_id):
-    destination = tempfile.mkdtemp()
-
-    # Download a font
-    font_url = make_fully_qualified_url(
-            '//fonts.googleapis.com/css?family=Roboto:400,300,300italic,400italic,700,700italic')
-    download_file(font_url, destination, request_fn=make_request, filename='roboto.css')
-
-    # Write out the HTML source, based on CSS formatting from
-    # https://k12.thoughtfullearning.com/resources/writingtopics
-
-    topics = (("<li>%s</li>" % topic.text) for topic in category_doc.select('.views-row'))
-    html_source = """
+# Page template for a writing topic category, based on CSS formatting from
+# https://k12.thoughtfullearning.com/resources/writingtopics
+writing_topic_html_template = """
         <!DOCTYPE html>
         <head>
             <link href='roboto.css' rel='stylesheet' type='text/css'>
@@ -280,15 +325,36 @@ def download_writing_topic_category(category_doc, title, level_id):
         <body>
             <ul>%s</ul>
         </body>
-    """ % ''.join(topics)
+    """
+
+
+def download_writing_topic_category(category_doc, title, level_id):
+    destination = tempfile.mkdtemp(dir=scratch_dir)
+    try:
+        # Download a font. Every category uses the same stylesheet, so fetch it
+        # once into the shared asset directory and copy it in from there.
+        font_url = make_fully_qualified_url(
+                '//fonts.googleapis.com/css?family=Roboto:400,300,300italic,400italic,700,700italic')
+        font_path = download_shared_asset(font_url)
+        if font_path:
+            shutil.copyfile(font_path, os.path.join(destination, 'roboto.css'))
+
+        # Write out the HTML source.
+        topics = ("<li>%s</li>" % html.escape(topic.text)
+                for topic in category_doc.select('.views-row'))
+        html_source = writing_topic_html_template % ''.join(topics)
 
-    with open(os.path.join(destination, "index.html"), "w") as f:
-        f.write(html_source)
+        with open(os.path.join(destination, "index.html"), "wb") as f:
+            f.write(html_source.encode("utf-8"))
 
-    print("    ... downloaded to %s" % destination)
-    #preview_in_browser(destination)
+        #preview_in_browser(destination)
+
+        zip_path = create_predictable_zip(destination)
+    finally:
+        shutil.rmtree(destination, ignore_errors=True)
+
+    print("    ... zipped to %s" % zip_path)
 
-    zip_path = create_predictable_zip(destination)
     return nodes.HTML5AppNode(
         source_id="%s|%s" % (level_id, title),
         title=truncate_metadata(title),
@@ -304,7 +370,7 @@ def download_writing_topic_category(category_doc, title, level_id):
 # Writing assessments
 
 
-writing_assessment_thumbnail = "https://k12.thoughtfullearning.com/sites/k12/files/images/assessmentModelResources.png"
+writing_assessment_thumbnail = k12_base_url + "/sites/k12/files/images/assessmentModelResources.png"
 
 
 def download_all_writing_assessments():
@@ -317,7 +383,8 @@ def download_all_writing_assessments():
     )
 
     doc = get_parsed_html_from_url(
-            'https://k12.thoughtfullearning.com/resources/writingassessment')
+            k12_base_url + '/resources/writingassessment',
+            strainer=class_strainer('view-writing-assessment-silo'))
     for grade in doc.select('.view-writing-assessment-silo'):
         title = grade.select_one('.view-grouping-header').contents[0].strip()
         grade_node = nodes.TopicNode(source_id=title, title=title, language="en")
@@ -343,6 +410,7 @@ def download_writing_assessment_grade(grade_node, grade_doc):
 
 
 def download_writing_assessment_category(category_node, category_doc):
+    articles = []
     for article in category_doc.select('ul li .views-field'):
         title = article.select_one('a').contents[0].strip()
         form = article.select_one('.assessmentModelListForm').text.strip()
@@ -350,67 +418,81 @@ def download_writing_assessment_category(category_node, category_doc):
         combined_title = "%s: %s (%s)" % (form, title, rating)
         url = make_fully_qualified_url(article.select_one('a')['href'])
         print("        Downloading writing assessment: %s" % combined_title)
-        download_content_node(category_node, url, combined_title, writing_assessment_thumbnail)
+        articles.append((url, combined_title, writing_assessment_thumbnail))
+
+    download_content_nodes(category_node, articles)
 
 
 ################################################################################
 # General helpers
 
 
-def download_content_node(category_node, url, title, thumbnail=None, description=None):
-    doc = get_parsed_html_from_url(url)
-
-    destination = tempfile.mkdtemp()
-    doc = download_static_assets(doc, destination,
-            'https://k12.thoughtfullearning.com', request_fn=make_request,
-            url_blacklist=url_blacklist)
-
-    remove_node(doc, '#header')
-    remove_node(doc, '.subMenuBarContainer')
-    remove_node(doc, '.breadbookmarkcontainer')
-    remove_node(doc, '.resourcePageTypeTitle')
-    remove_node(doc, '.sharethis-wrapper')
-    remove_node(doc, '.ccBlock')
-    remove_node(doc, '#block-views-resource-info-block-block-1')
-    remove_node(doc, '#block-views-resource-info-block-block-1')
-    remove_node(doc, '#block-views-resource-info-block-block')
-    remove_node(doc, '.productSuggestionContainer')
-    remove_node(doc, 'footer')
+# Site chrome and links back to the live site, stripped from every content
+# page in a single pass over the document.
+content_page_chrome_selector = ', '.join((
+    '#header',
+    '.subMenuBarContainer',
+    '.breadbookmarkcontainer',
+    '.resourcePageTypeTitle',
+    '.sharethis-wrapper',
+    '.ccBlock',
+    '#block-views-resource-info-block-block-1',
+    '#block-views-resource-info-block-block',
+    '.productSuggestionContainer',
+    'footer',
 
     # For minilessons
-    remove_node(doc, '.field-name-field-minilesson-downloadables')
+    '.field-name-field-minilesson-downloadables',
 
     # For writing assessments
-    remove_node(doc, '.assessmentTGLink')
-    remove_node(doc, '.assessmentModelRubrics')
-    remove_node(doc, '.view-display-id-attachment_1')
+    '.assessmentTGLink',
+    '.assessmentModelRubrics',
+    '.view-display-id-attachment_1',
+))
+
+
+# Content pages are independent and almost entirely network-bound, so they
+# are downloaded on one shared pool. Only the content pages themselves run
+# here; anything that waits on them must run on another thread.
+download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+
+# Small side jobs a content page waits on (its thumbnail, its video
+# metadata). They get their own pool so a page never waits on work queued
+# behind other pages in `download_executor`.
+side_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+
+def download_content_nodes(category_node, items):
+    """
+    Download each `download_content_node` argument tuple in `items` on
+    `download_executor`, then add the resulting nodes to `category_node` in
+    the original order.
+    """
+    results = download_executor.map(lambda item: download_content_node(*item), items)
+    for content_nodes in results:
+        for node in content_nodes:
+            category_node.add_child(node)
 
-    # Write out the HTML source.
-    with open(os.path.join(destination, "index.html"), "w") as f:
-        f.write(str(doc))
 
-    print("    ... downloaded to %s" % destination)
-    #preview_in_browser(destination)
+def download_content_node(url, title, thumbnail=None, description=None):
+    """
+    Download the page at `url` as an HTML5 app and return the list of nodes
+    to add to its category: the embedded video (if any) followed by the app.
+    """
+    content_nodes = []
 
-    thumbnail_path = None
+    thumbnail_future = None
     if thumbnail:
         # Manually download the thumbnail and use it so we can lowercase the
-        # extension to be accepted by Ricecooker.
-        thumbnail_filename = derive_filename(thumbnail)
-        thumbnail_path = os.path.join(destination, thumbnail_filename)
-        download_file(thumbnail, destination, request_fn=make_request,
-                filename=thumbnail_filename)
+        # extension to be accepted by Ricecooker. Fetch it in the background
+        # while the page itself is downloaded.
+        thumbnail_future = side_executor.submit(download_shared_asset, thumbnail)
 
-    # If there is an embedded video in the page source grab it as a video node.
-    video_node = None
-    iframe = doc.select_one('.embedded-video iframe')
-    if iframe:
-        youtube_url = iframe['src']
-        youtube_id = get_youtube_id_from_url(youtube_url)
-        info = ydl.extract_info(youtube_url, download=False)
-        video_title = info['title']
-        print("    ... and with video titled %s from www.youtube.com/watch?v=%s" % (
-                video_title, youtube_id))
+    zip_path, video = download_content_page(url)
+    thumbnail_path = thumbnail_future.result() if thumbnail_future else None
+
+    if video:
+        youtube_id, info = video
         video_node = nodes.VideoNode(
             source_id=youtube_id,
             title=truncate_metadata(info['title']),
@@ -421,9 +503,8 @@ def download_content_node(category_node, url, title, thumbnail=None, description
             derive_thumbnail=True,
             files=[files.YouTubeVideoFile(youtube_id)],
         )
-        category_node.add_child(video_node)
+        content_nodes.append(video_node)
 
-    zip_path = create_predictable_zip(destination)
     app_node = nodes.HTML5AppNode(
         source_id=url,
         title=truncate_metadata(title),
@@ -435,7 +516,107 @@ def download_content_node(category_node, url, title, thumbnail=None, description
         language="en",
     )
 
-    category_node.add_child(app_node)
+    content_nodes.append(app_node)
+    return content_nodes
+
+
+content_pages = {}
+content_page_locks = {}
+content_page_lock = threading.Lock()
+
+
+def download_content_page(url):
+    """
+    Return `(zip_path, video)` for the page at `url`, downloading it only the
+    first time it is asked for. A page linked from several categories is
+    fetched, cleaned up and zipped once, and each category builds its own
+    nodes from the result.
+    """
+    with content_page_lock:
+        page_lock = content_page_locks.setdefault(url, threading.Lock())
+
+    with page_lock:
+        if url not in content_pages:
+            content_pages[url] = build_content_page(url)
+        return content_pages[url]
+
+
+def build_content_page(url):
+    """
+    Download the page at `url` and its static assets, zip it up, and return
+    `(zip_path, video)`, where `video` is `(youtube_id, info)` for an embedded
+    YouTube video or None.
+    """
+    doc = get_parsed_html_from_url(url)
+
+    # If there is an embedded video in the page source grab it as a video node.
+    # Start probing it now so the lookup overlaps with the asset downloads.
+    video_future = None
+    iframe = doc.select_one('.embedded-video iframe')
+    if iframe:
+        youtube_url = iframe['src']
+        youtube_id = get_youtube_id_from_url(youtube_url)
+        video_future = side_executor.submit(get_youtube_info, youtube_id)
+
+    # Pages often reference the same stylesheet, script or image several
+    # times, and ricecooker gives every reference its own random filename,
+    # so memoize requests for this page to fetch each URL only once.
+    page_request = functools.lru_cache(maxsize=None)(make_request)
+
+    destination = tempfile.mkdtemp(dir=scratch_dir)
+    try:
+        doc = download_static_assets(doc, destination,
+                k12_base_url, request_fn=page_request,
+                url_blacklist=url_blacklist)
+
+        # Matches come back in document order; decompose them last to first so a
+        # node is never decomposed after an enclosing match already destroyed it.
+        for node in reversed(doc.select(content_page_chrome_selector)):
+            node.decompose()
+
+        # Write out the HTML source, encoding straight to UTF-8 bytes rather than
+        # building an intermediate str of the whole page.
+        with open(os.path.join(destination, "index.html"), "wb") as f:
+            f.write(doc.encode("utf-8", formatter="minimal"))
+
+        #preview_in_browser(destination)
+
+        zip_path = create_predictable_zip(destination)
+    finally:
+        shutil.rmtree(destination, ignore_errors=True)
+
+    print("    ... zipped to %s" % zip_path)
+
+    video = None
+    if video_future:
+        info = video_future.result()
+        video_title = info['title']
+        print("    ... and with video titled %s from www.youtube.com/watch?v=%s" % (
+                video_title, youtube_id))
+        video = (youtube_id, info)
+
+    return zip_path, video
+
+
+youtube_infos = {}
+
+
+def get_youtube_info(youtube_id):
+    """
+    Return youtube_dl's metadata for a video, probing YouTube only the first
+    time each video is seen; the same video is often embedded on many pages.
+    The cache is checked and filled under `ydl_lock`, so pages that ask for
+    the same video at once wait for the first probe instead of repeating it.
+    """
+    global ydl
+    with ydl_lock:
+        if youtube_id not in youtube_infos:
+            if ydl is None:
+                import youtube_dl
+                ydl = youtube_dl.YoutubeDL(ydl_options)
+            youtube_infos[youtube_id] = ydl.extract_info(
+                    'https://www.youtube.com/watch?v=%s' % youtube_id, download=False)
+        return youtube_infos[youtube_id]
 
 
 # From https://stackoverflow.com/a/7936523
@@ -462,12 +643,6 @@ def get_youtube_id_from_url(value):
     return None
 
 
-def remove_node(doc, selector):
-    node = doc.select_one(selector)
-    if node:
-        node.decompose()
-
-
 def truncate_metadata(data_string):
     MAX_CHARS = 190
     if len(data_string) > MAX_CHARS:
@@ -475,6 +650,8 @@ def truncate_metadata(data_string):
     return data_string
 
 
+# Substrings of asset URLs to skip. The matching itself is done by
+# ricecooker's download_static_assets, which takes this list as is.
 url_blacklist = [
     'analytics.js',
     'infocusbackground.png',
@@ -505,16 +682,46 @@ url_blacklist = [
     'inquireto.png',
 ]
 
-def is_blacklisted(url):
-    return any((item in url.lower()) for item in url_blacklist)
-
-
 def derive_filename(url):
     name = os.path.basename(urlparse(url).path).replace('%', '_')
-    return ("%s.%s" % (uuid.uuid4().hex, name)).lower()
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).hexdigest()
+    return ("%s.%s" % (digest, name)).lower()
 
 
-def make_request(url, clear_cookies=True, timeout=60, *args, **kwargs):
+shared_asset_dir = tempfile.mkdtemp()
+shared_asset_locks = {}
+shared_asset_lock = threading.Lock()
+
+
+def download_shared_asset(url):
+    """
+    Download `url` into `shared_asset_dir` once per run and return its local
+    path. Assets such as the section thumbnails are reused by many content
+    nodes, so later calls for the same URL just return the existing file.
+    Returns None if the server does not answer with a 200, so an error page
+    is never stored and reused as the asset; a later call tries again.
+    """
+    with shared_asset_lock:
+        url_lock = shared_asset_locks.setdefault(url, threading.Lock())
+
+    with url_lock:
+        filename = derive_filename(url)
+        path = os.path.join(shared_asset_dir, filename)
+        if not os.path.exists(path):
+            # Stream the body straight to disk rather than buffering it all in
+            # memory, and only move it into place once it is complete.
+            partial_path = path + '.part'
+            with make_request(url, stream=True) as response:
+                if response.status_code != 200:
+                    return None
+                with open(partial_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+            os.replace(partial_path, path)
+    return path
+
+
+def make_request(url, clear_cookies=False, timeout=60, *args, **kwargs):
     if clear_cookies:
         sess.cookies.clear()
 
@@ -522,7 +729,7 @@ def make_request(url, clear_cookies=True, timeout=60, *args, **kwargs):
     max_retries = 5
     while True:
         try:
-            response = sess.get(url, headers=headers, timeout=timeout, *args, **kwargs)
+            response = sess.get(url, timeout=timeout, *args, **kwargs)
             break
         except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout) as e:
             retry_count += 1
@@ -538,23 +745,37 @@ def make_request(url, clear_cookies=True, timeout=60, *args, **kwargs):
     return response
 
 
-def get_parsed_html_from_url(url, *args, **kwargs):
-    html = make_request(url, *args, **kwargs).content
-    return BeautifulSoup(html, "html.parser")
+def class_strainer(class_name):
+    """
+    Return a SoupStrainer for elements that have `class_name` among their
+    classes. While parsing, bs4 hands the strainer the raw class attribute
+    string, so `SoupStrainer(class_=...)` would miss Drupal's multi-class
+    wrappers such as `class="panel-pane pane-views-panes"`.
+    """
+    def has_class(value):
+        if not value:
+            return False
+        classes = value.split() if isinstance(value, str) else value
+        return class_name in classes
+
+    return SoupStrainer(attrs={'class': has_class})
+
+
+def get_parsed_html_from_url(url, strainer=None):
+    # Index pages pass a `strainer` so only the listing they walk is built.
+    html = make_request(url).content
+    return BeautifulSoup(html, "lxml", parse_only=strainer)
 
 
 def make_fully_qualified_url(url):
-    base = 'https://k12.thoughtfullearning.com'
-    if url.startswith("../images"):
-        return base + url[2:]
-    if url.startswith("../scripts"):
-        return base + url[2:]
+    if url.startswith(("../images", "../scripts")):
+        return k12_base_url + url[2:]
     if url.startswith("//"):
         return "http:" + url
     if url.startswith("/"):
-        return base + url
-    if not url.startswith("http"):
-        return "%s/%s" % (base, url)
+        return k12_base_url + url
+    if not url.startswith(("http:", "https:")):
+        return "%s/%s" % (k12_base_url, url)
     return url
 
 